@@ -1,9 +1,21 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 import numpy as np
 import pandas as pd
-import yfinance as yf
-import matplotlib.pyplot as plt
+
+from price_cache import cached_frame
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional: fall back to plain Python
+    prange = range
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 
 # ============================== Defaults ======================================
@@ -13,6 +25,8 @@ DEFAULTS = dict(
     end_date="2025-08-01",
     ticker1="VEQT.TO",          # 
     ticker2="SU.TO",            #
+    label1="Stock1",           # column/plot label for ticker1
+    label2="Stock2",           # column/plot label for ticker2
     shares1_init=500,          # start long asset 1
     shares2_init=0,
     cash_init=0.0,
@@ -21,27 +35,41 @@ DEFAULTS = dict(
     fee_bps=0.0,               # commission bps per leg
     slippage_bps=0.0,          # slippage bps on execution price
     export_csv="",             # path to export daily results ("" to skip)
+    plot_file="",              # save plot here via Agg instead of a window ("" to show)
+    export_dtype="float64",    # dtype of returned equity curves ("float32" halves memory)
     plot=True
 )
 
 # ============================== Data helpers ==================================
 
-def col1d(frame: pd.DataFrame, col: str) -> pd.Series:
+CACHE_TTL_SECONDS = 12 * 3600
+
+
+def cached_download(ticker: str, ttl: float = CACHE_TTL_SECONDS, **kwargs) -> pd.DataFrame:
     """
-    Return a 1-D float Series for frame[col] even if it's (n,1) or already a Series.
-    Keeps the original index.
+    yf.download behind the on-disk Parquet cache (price_cache), keyed by (ticker, download args).
+    A cache file younger than `ttl` seconds is read back instead of hitting the network;
+    a single hit already pays for the Parquet write.
     """
-    arr = np.asarray(frame[col])   # handles Series or DataFrame column
-    arr = arr.ravel()              # force 1-D
-    return pd.Series(arr, index=frame.index, name=col, dtype="float64")
+    def fetch():
+        import yfinance as yf  # lazy: cache hits and sweeps over loaded data skip the import
+        return yf.download(ticker, progress=False, auto_adjust=False, **kwargs)
+
+    return cached_frame((ticker, sorted(kwargs.items())), ttl, fetch)
+
 
+@lru_cache(maxsize=64)
 def fetch_data(ticker: str, label: str, start: str, end: str) -> pd.DataFrame:
     """
-    Download OHLC from Yahoo and rename Open/Close to Open_<label>, Close_<label>.
+    Download OHLC from Yahoo (cached) and rename Open/Close to Open_<label>, Close_<label>.
+    Memoized in-process for parameter sweeps: treat the returned frame as read-only.
     """
-    df = yf.download(ticker, start=start, end=end, progress=False, auto_adjust=False)
+    df = cached_download(ticker, start=start, end=end, interval="1d")
     if df.empty:
         raise ValueError(f"No data for {ticker}. Check symbol/date range/network.")
+    # yfinance returns (Price, Ticker) column levels; flatten so every column is 1-D
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
     df = df.rename(columns={"Open": f"Open_{label}", "Close": f"Close_{label}"})
     # keep only the columns we need
     df = df[[f"Open_{label}", f"Close_{label}"]].sort_index()
@@ -51,25 +79,15 @@ def fetch_data(ticker: str, label: str, start: str, end: str) -> pd.DataFrame:
 def align_two(left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
     """
     Inner-join by date, sort, drop NaNs, and remove duplicate timestamps (keep first).
-    This avoids Series->float conversion errors later.
+    The backtest relies on this to read prices positionally (row i, row i-1).
     """
     combined = left.join(right, how="inner").sort_index().dropna()
-    if not combined.index.is_unique:
-        combined = combined[~combined.index.duplicated(keep="first")]
+    idx = combined.index
+    if not idx.is_unique:
+        combined = combined[~idx.duplicated(keep="first")]
     return combined
 
 
-def sget(series: pd.Series, dt) -> float:
-    """
-    Safe scalar getter: returns a float even if the index has duplicates.
-    If multiple rows exist at dt, take the first (or replace with .mean()).
-    """
-    val = series.loc[dt]
-    if isinstance(val, pd.Series):
-        val = val.iloc[0]
-    return float(val)
-
-
 # ============================== Execution model ================================
 
 @dataclass
@@ -80,17 +98,16 @@ class TradeParams:
     slippage_bps: float = DEFAULTS["slippage_bps"]
 
 
-def exec_price(open_px: float, slippage_bps: float, side: str) -> float:
+@njit(inline="always")
+def exec_price(open_px: float, slippage_bps: float, sign: float) -> float:
     """
-    Apply slippage to execution price:
+    Apply slippage to execution price, sign = +1 for a buy, -1 for a sell:
       buy @ open * (1 + s), sell @ open * (1 - s)
     """
-    s = slippage_bps / 1e4
-    if side.lower() == "buy":
-        return open_px * (1 + s)
-    return open_px * (1 - s)
+    return open_px * (1 + sign * (slippage_bps / 1e4))
 
 
+@njit(inline="always")
 def fee_on_notional(notional: float, fee_bps: float) -> float:
     """
     Commission/fee as bps of notional (per leg).
@@ -98,6 +115,133 @@ def fee_on_notional(notional: float, fee_bps: float) -> float:
     return abs(notional) * (fee_bps / 1e4)
 
 
+def overnight_returns(open_px: np.ndarray, close_px: np.ndarray) -> np.ndarray:
+    """
+    Vectorized overnight return Open(t) / Close(t-1) - 1. Bar 0 has no prior close -> 0.
+    """
+    r = np.empty_like(open_px)
+    r[0] = 0.0
+    r[1:] = open_px[1:] / close_px[:-1] - 1.0
+    return r
+
+
+def overnight_edge_bps(o1: np.ndarray, c1: np.ndarray, o2: np.ndarray, c2: np.ndarray) -> np.ndarray:
+    """
+    Edge in bps per bar: (r2 - r1) * 1e4, positive -> favor asset 2.
+    """
+    return (overnight_returns(o2, c2) - overnight_returns(o1, c1)) * 1e4
+
+
+def _make_switch_loop(has_costs: bool, has_cooldown: bool):
+    """
+    Build the switching loop with cost and cooldown handling fixed at compile time.
+    numba freezes the closure flags as constants, so a disabled feature's arithmetic
+    and checks are compiled out of the per-bar path.
+    """
+    @njit(cache=True)
+    def switch_loop(o1, c1, o2, c2, edge, shares1, shares2, cash,
+                    hyst, cooldown_days, fee_bps, slip_bps, day_ordinals):
+        n = len(o1)
+        holding1 = shares1 > 0
+        last_switch_day = -10**9  # sentinel: no switch yet, cooldown always satisfied
+
+        eq_active = np.empty(n, dtype=np.float64)
+        pos_flag = np.empty(n, dtype=np.int8)
+        switches = 0
+        turnover = 0.0
+        hits_count = 0
+        hits_total = 0
+
+        for i in range(n):
+            # Decide if we switch (hysteresis + cooldown): sign the edge toward the asset
+            # we don't hold, so one compare covers both directions
+            cooldown_ok = (not has_cooldown) or day_ordinals[i] - last_switch_day >= cooldown_days
+            edge_signed = edge[i] * (1.0 if holding1 else -1.0)
+            do_switch = i > 0 and cooldown_ok and edge_signed > hyst
+            target_is_2 = holding1
+
+            if do_switch:
+                # SELL current holding at open with slippage; pay fee on notional
+                sell_px = o1[i] if holding1 else o2[i]
+                if has_costs:
+                    sell_px = exec_price(sell_px, slip_bps, -1.0)
+                if holding1:
+                    notional = shares1 * sell_px
+                    shares1 = 0
+                else:
+                    notional = shares2 * sell_px
+                    shares2 = 0
+                cash += notional
+                if has_costs:
+                    cash -= fee_on_notional(notional, fee_bps)
+                turnover += abs(notional)
+
+                # BUY target with all cash (integer shares); pay fee
+                buy_px = o2[i] if target_is_2 else o1[i]
+                if has_costs:
+                    buy_px = exec_price(buy_px, slip_bps, 1.0)
+                new_shares = int(cash // buy_px)
+                if target_is_2:
+                    shares2 += new_shares
+                else:
+                    shares1 += new_shares
+                notional = new_shares * buy_px
+                cash -= notional
+                if has_costs:
+                    cash -= fee_on_notional(notional, fee_bps)
+                turnover += abs(notional)
+                holding1 = not target_is_2
+
+                last_switch_day = day_ordinals[i]
+                switches += 1
+
+                # Simple "hit" proxy by close
+                hits_total += 1
+                if target_is_2:
+                    hits_count += (c2[i] / c1[i]) > 1.0
+                else:
+                    hits_count += (c1[i] / c2[i]) > 1.0
+
+            # Mark-to-close equity
+            eq_active[i] = shares1 * c1[i] + shares2 * c2[i] + cash
+            pos_flag[i] = 1 if holding1 else -1
+
+        return eq_active, pos_flag, switches, turnover, hits_count, hits_total
+
+    return switch_loop
+
+
+# Compiled variants keyed by (has_costs, has_cooldown); each compiles on first use
+_SWITCH_LOOPS = {(costs, cooldown): _make_switch_loop(costs, cooldown)
+                 for costs in (False, True) for cooldown in (False, True)}
+
+# Path-dependent switching state machine over plain float64/int64 arrays, general case.
+# Returns (eq_active, pos_flag, switches, turnover, hits_count, hits_total).
+backtest_switching_core = _SWITCH_LOOPS[(True, True)]
+
+
+@njit(parallel=True, cache=True)
+def _sweep_kernel(o1, c1, o2, c2, edge, shares1, shares2, cash, grid, day_ordinals):
+    """
+    Run backtest_switching_core for every row of grid = [[hyst, cooldown, fee, slip], ...]
+    in parallel. Returns eq_all (K, n) and stats (K, 4) = switches, turnover, hits, total.
+    """
+    k_runs = grid.shape[0]
+    eq_all = np.empty((k_runs, len(o1)), dtype=np.float64)
+    stats = np.empty((k_runs, 4), dtype=np.float64)
+    for k in prange(k_runs):
+        eq, _, switches, turnover, hits_count, hits_total = backtest_switching_core(
+            o1, c1, o2, c2, edge, shares1, shares2, cash,
+            grid[k, 0], int(grid[k, 1]), grid[k, 2], grid[k, 3], day_ordinals,
+        )
+        eq_all[k, :] = eq
+        stats[k, 0] = switches
+        stats[k, 1] = turnover
+        stats[k, 2] = hits_count
+        stats[k, 3] = hits_total
+    return eq_all, stats
+
+
 # ============================== Analytics ======================================
 
 def annualize_factor(freq="D"):
@@ -114,28 +258,37 @@ def compute_metrics(equity_curve: pd.Series, rf=0.0):
     """
     Basic performance metrics from an equity curve marked to close:
     - CAGR, annualized volatility, Sharpe (excess, rf≈0), Max drawdown
+    Thin pandas wrapper around compute_metrics_arrays.
     """
     px = equity_curve.dropna()
-    rets = px.pct_change().dropna()
+    day_ordinals = px.index.values.astype("datetime64[D]").view(np.int64)
+    return compute_metrics_arrays(px.to_numpy(dtype=np.float64), day_ordinals, rf=rf)
+
+
+def compute_metrics_arrays(px: np.ndarray, day_ordinals: np.ndarray, rf=0.0):
+    """
+    Same metrics on raw arrays: `px` is a clean (NaN-free) float64 equity curve and
+    `day_ordinals` its int64 calendar days (datetime64[D] viewed as int64).
+    """
+    n = len(px)
+    rets = np.diff(px) / px[:-1]
 
     # CAGR
-    if len(px) >= 2:
-        n_years = (px.index[-1] - px.index[0]).days / 365.25
-        cagr = (px.iloc[-1] / px.iloc[0]) ** (1 / n_years) - 1 if n_years > 0 else np.nan
+    if n >= 2:
+        n_years = (day_ordinals[-1] - day_ordinals[0]) / 365.25
+        cagr = (px[-1] / px[0]) ** (1 / n_years) - 1 if n_years > 0 else np.nan
     else:
         cagr = np.nan
 
-    # Vol (ann)
+    # Vol (ann), sample std like pandas
     ann = annualize_factor("D")
-    vol = rets.std() * ann if len(rets) else np.nan
+    vol = rets.std(ddof=1) * ann if len(rets) > 1 else np.nan
 
     # Sharpe
     sharpe = (rets.mean() * 252 - rf) / vol if (vol and vol > 0) else np.nan
 
     # Max Drawdown
-    rolling_max = px.cummax()
-    dd = px / rolling_max - 1.0
-    max_dd = dd.min() if len(dd) else np.nan
+    max_dd = (px / np.maximum.accumulate(px) - 1.0).min() if n else np.nan
 
     return {"CAGR": cagr, "Volatility_ann": vol, "Sharpe": sharpe, "MaxDrawdown": max_dd}
 
@@ -152,6 +305,24 @@ def pretty_metrics(m):
 
 # ============================== Strategy core ==================================
 
+def _strategy_arrays(data: pd.DataFrame, label1: str, label2: str):
+    """
+    Contiguous float64 Open/Close arrays, edge in bps, and int64 day ordinals for `data`.
+    """
+    idx = data.index  # bound once; never touched per bar
+    assert idx.is_unique, "data must have a unique index (use align_two)"
+
+    # Pull open/close once as contiguous float64 arrays (fetch_data keeps columns 1-D)
+    o1 = data[f"Open_{label1}"].to_numpy(dtype=np.float64)
+    c1 = data[f"Close_{label1}"].to_numpy(dtype=np.float64)
+    o2 = data[f"Open_{label2}"].to_numpy(dtype=np.float64)
+    c2 = data[f"Close_{label2}"].to_numpy(dtype=np.float64)
+
+    edge = overnight_edge_bps(o1, c1, o2, c2)
+    day_ordinals = idx.values.astype("datetime64[D]").view(np.int64)  # days since epoch
+    return o1, c1, o2, c2, edge, day_ordinals
+
+
 def backtest_switching(
     data: pd.DataFrame,
     shares1_init: int,
@@ -160,6 +331,7 @@ def backtest_switching(
     params: TradeParams,
     label1="Stock1",
     label2="Stock2",
+    export_dtype="float64",
 ):
     """
     Compare overnight returns:
@@ -167,210 +339,200 @@ def backtest_switching(
     If r_other - r_current > hysteresis_bps -> switch at OPEN.
 
     Mark-to-close equity each day. Track switches, hit rate, turnover.
+    Ledger math runs in float64; equity columns are returned as `export_dtype`.
     """
 
     idx = data.index
+    o1, c1, o2, c2, edge, day_ordinals = _strategy_arrays(data, label1, label2)
+
+    # ---- PASSIVE EQUITY (vectorized into one buffer, updated in place) ----
+    passive_equity = np.multiply(c1, float(shares1_init))
+    passive_equity += float(shares2_init) * c2
+    passive_equity += float(cash_init)
+
+    # ---- ACTIVE LOOP (compiled state machine, specialized for zero costs / no cooldown) ----
+    has_costs = params.fee_bps != 0 or params.slippage_bps != 0
+    has_cooldown = params.cooldown_days > 0
+    switch_loop = _SWITCH_LOOPS[(has_costs, has_cooldown)]
+    eq_active, pos_flag, switches, turnover_notional, hits_count, hits_total = switch_loop(
+        o1, c1, o2, c2, edge,
+        int(shares1_init), int(shares2_init), float(cash_init),
+        float(params.hysteresis_bps), int(params.cooldown_days),
+        float(params.fee_bps), float(params.slippage_bps), day_ordinals,
+    )
 
-    # Pull open/close as 1-D Series (guard against accidental 2-D)
-    o1 = col1d(data, f"Open_{label1}")
-    c1 = col1d(data, f"Close_{label1}")
-    o2 = col1d(data, f"Open_{label2}")
-    c2 = col1d(data, f"Close_{label2}")
-
-
-    # ---- PASSIVE EQUITY (vectorized, 1-D Series) ----
-    passive_equity_series = (shares1_init * c1 + shares2_init * c2 + float(cash_init))
-    # ensure unique index
-    if not passive_equity_series.index.is_unique:
-        passive_equity_series = passive_equity_series[~passive_equity_series.index.duplicated(keep="first")]
-    # align to idx (active dates)
-    passive_equity_series = passive_equity_series.reindex(idx).astype(float)
-    passive_equity_series.name = "Equity_Passive"
-
-    # ---- ACTIVE LOOP ----
-    shares1, shares2 = shares1_init, shares2_init
-    cash = float(cash_init)
-    holding1 = shares1_init > 0
-    last_switch_date = None
-
-    eq_active = []
-    pos_flag = []
-    switches = 0
-    turnover_notional = 0.0
-    switch_hits = []
-
-    for i, dt in enumerate(idx):
-        open1 = sget(o1, dt)
-        close1 = sget(c1, dt)
-        open2 = sget(o2, dt)
-        close2 = sget(c2, dt)
-
-        if i == 0:
-            r1 = r2 = 0.0
-            edge_bps = 0.0
-        else:
-            prev_dt = idx[i - 1]
-            prev_close1 = sget(c1, prev_dt)
-            prev_close2 = sget(c2, prev_dt)
-            r1 = (open1 - prev_close1) / prev_close1
-            r2 = (open2 - prev_close2) / prev_close2
-            edge_bps = (r2 - r1) * 1e4  # positive -> favor asset 2
-
-        # Decide if we switch (hysteresis + cooldown)
-        do_switch = False
-        target_is_2 = False
-        cooldown_ok = (last_switch_date is None) or ((dt - last_switch_date).days >= params.cooldown_days)
-
-        if i > 0 and cooldown_ok:
-            if holding1 and (edge_bps > params.hysteresis_bps):
-                do_switch, target_is_2 = True, True
-            elif (not holding1) and (edge_bps < -params.hysteresis_bps):
-                do_switch, target_is_2 = True, False
-
-        if do_switch:
-            # SELL current holding at open with slippage; pay fee on notional
-            if holding1:
-                sell_px = exec_price(open1, params.slippage_bps, side="sell")
-                notional = shares1 * sell_px
-                cash += notional
-                cash -= fee_on_notional(notional, params.fee_bps)
-                turnover_notional += abs(notional)
-                shares1 = 0
-            else:
-                sell_px = exec_price(open2, params.slippage_bps, side="sell")
-                notional = shares2 * sell_px
-                cash += notional
-                cash -= fee_on_notional(notional, params.fee_bps)
-                turnover_notional += abs(notional)
-                shares2 = 0
+    # Build results DataFrame straight from the preallocated arrays (no per-column Series)
+    results = pd.DataFrame({
+        "Equity_Active": eq_active.astype(export_dtype, copy=False),
+        "Equity_Passive": passive_equity.astype(export_dtype, copy=False),
+        "PositionFlag": pos_flag,
+    }, index=idx)
 
-            # BUY target with all cash (integer shares); pay fee
-            if target_is_2:
-                buy_px = exec_price(open2, params.slippage_bps, side="buy")
-                new_shares = int(cash // buy_px)
-                notional = new_shares * buy_px
-                shares2 += new_shares
-                cash -= notional
-                cash -= fee_on_notional(notional, params.fee_bps)
-                turnover_notional += abs(notional)
-                holding1 = False
-            else:
-                buy_px = exec_price(open1, params.slippage_bps, side="buy")
-                new_shares = int(cash // buy_px)
-                notional = new_shares * buy_px
-                shares1 += new_shares
-                cash -= notional
-                cash -= fee_on_notional(notional, params.fee_bps)
-                turnover_notional += abs(notional)
-                holding1 = True
+    stats = {
+        "Switches": int(switches),
+        "Turnover_Notional": float(turnover_notional),
+        "HitRate": hits_count / hits_total if hits_total else np.nan,
+    }
+    return results, stats
 
-            last_switch_date = dt
-            switches += 1
 
-            # Simple "hit" proxy by close
-            if target_is_2 and i > 0:
-                switch_hits.append((close2 / close1) > 1.0)
-            elif (not target_is_2) and i > 0:
-                switch_hits.append((close1 / close2) > 1.0)
+def sweep_switching(
+    data: pd.DataFrame,
+    shares1_init: int,
+    shares2_init: int,
+    cash_init: float,
+    grid,
+    label1="Stock1",
+    label2="Stock2",
+):
+    """
+    Backtest many parameter sets at once. `grid` is a sequence of TradeParams or an
+    array of rows [hysteresis_bps, cooldown_days, fee_bps, slippage_bps]; rows run in
+    parallel (numba prange) over shared price arrays.
 
-        # Mark-to-close equity
-        equity_today = shares1 * close1 + shares2 * close2 + cash
-        eq_active.append(equity_today)
-        pos_flag.append(1 if holding1 else -1)
+    Returns (equity, stats): equity is a (K, n) array of active equity curves on
+    data.index, stats a DataFrame with one row per parameter set.
+    """
+    if len(grid) and isinstance(grid[0], TradeParams):
+        grid = [[p.hysteresis_bps, p.cooldown_days, p.fee_bps, p.slippage_bps] for p in grid]
+    grid = np.asarray(grid, dtype=np.float64).reshape(-1, 4)
+
+    o1, c1, o2, c2, edge, day_ordinals = _strategy_arrays(data, label1, label2)
+    equity, raw = _sweep_kernel(
+        o1, c1, o2, c2, edge,
+        int(shares1_init), int(shares2_init), float(cash_init),
+        grid, day_ordinals,
+    )
 
-    # Build results DataFrame (all 1-D, aligned)
-    results = pd.DataFrame({
-        "Equity_Active": pd.Series(eq_active, index=idx, dtype="float64"),
-        "Equity_Passive": passive_equity_series,
-        "PositionFlag": pd.Series(pos_flag, index=idx, dtype="int8"),
+    hits_total = raw[:, 3]
+    stats = pd.DataFrame({
+        "hysteresis_bps": grid[:, 0],
+        "cooldown_days": grid[:, 1].astype(np.int64),
+        "fee_bps": grid[:, 2],
+        "slippage_bps": grid[:, 3],
+        "Switches": raw[:, 0].astype(np.int64),
+        "Turnover_Notional": raw[:, 1],
+        "HitRate": np.divide(raw[:, 2], hits_total, out=np.full(len(grid), np.nan), where=hits_total > 0),
     })
-
-    stats = {
-        "Switches": switches,
-        "Turnover_Notional": turnover_notional,
-        "HitRate": float(np.mean(switch_hits)) if len(switch_hits) else np.nan,
-    }
-    return results, stats
+    return equity, stats
 
 
 # ============================== Plotting =======================================
 
-def plot_results(df: pd.DataFrame, label1="Stock1", label2="Stock2"):
-    fig, axes = plt.subplots(2, 1, figsize=(12, 8), sharex=True,
-                             gridspec_kw={"height_ratios": [3, 1]})
+def plot_results(df: pd.DataFrame, label1="Stock1", label2="Stock2", save_path=""):
+    """
+    Plot equity curves and position. With save_path, render off-screen on a private
+    Agg canvas and write the figure to disk instead of opening a window; pyplot's
+    global backend is left untouched, so later interactive calls still work.
+    """
+    # Plot raw arrays: skips pandas' per-column plotting/dtype inference path
+    x = df.index
+    equity = df[["Equity_Active", "Equity_Passive"]].to_numpy()
+    pos = df["PositionFlag"].to_numpy()
+
+    # Imported lazily so sweeps that never plot skip matplotlib's import cost
+    if save_path:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(12, 8))
+        FigureCanvasAgg(fig)
+    else:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=(12, 8))
+    axes = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]})
 
     ax = axes[0]
-    df["Equity_Active"].plot(ax=ax, label="Active (switching)", lw=2)
-    df["Equity_Passive"].plot(ax=ax, label="Passive (buy&hold)", lw=2, alpha=0.85)
+    ax.plot(x, equity[:, 0], label="Active (switching)", lw=2)
+    ax.plot(x, equity[:, 1], label="Passive (buy&hold)", lw=2, alpha=0.85)
     ax.set_title("Equity Curves (Marked to Close)")
     ax.set_ylabel("Portfolio Value (CAD)")
     ax.grid(True, alpha=0.3)
     ax.legend()
 
     ax2 = axes[1]
-    df["PositionFlag"].plot(ax=ax2, drawstyle="steps-post")
+    ax2.step(x, pos, where="post")
     ax2.set_title(f"Position: +1 = {label1}, -1 = {label2}")
     ax2.set_ylim(-1.5, 1.5)
     ax2.grid(True, alpha=0.3)
 
-    plt.tight_layout()
-    plt.show()
+    fig.tight_layout()
+    if save_path:
+        fig.savefig(save_path)
+    else:
+        plt.show()
 
 
 # ============================== Main ===========================================
 
-def main():
-    parser = argparse.ArgumentParser(description="VFV vs SU Switching Backtest (Robust & Fixed)")
-    parser.add_argument("--start", default=DEFAULTS["start_date"])
-    parser.add_argument("--end", default=DEFAULTS["end_date"])
-    parser.add_argument("--ticker1", default=DEFAULTS["ticker1"])
-    parser.add_argument("--ticker2", default=DEFAULTS["ticker2"])
-    parser.add_argument("--shares1", type=int, default=DEFAULTS["shares1_init"])
-    parser.add_argument("--shares2", type=int, default=DEFAULTS["shares2_init"])
-    parser.add_argument("--cash", type=float, default=DEFAULTS["cash_init"])
-    parser.add_argument("--hysteresis_bps", type=float, default=DEFAULTS["hysteresis_bps"])
-    parser.add_argument("--cooldown", type=int, default=DEFAULTS["cooldown_days"])
-    parser.add_argument("--fee_bps", type=float, default=DEFAULTS["fee_bps"])
-    parser.add_argument("--slippage_bps", type=float, default=DEFAULTS["slippage_bps"])
-    parser.add_argument("--export_csv", default=DEFAULTS["export_csv"])
-    parser.add_argument("--no-plot", action="store_true")
-    args = parser.parse_args()  # in notebooks, use parser.parse_args([])
-
-    label1, label2 = "Stock1", "Stock2"
-
-    # Load & align data (duplicate-safe)
-    d1 = fetch_data(args.ticker1, label1, args.start, args.end)
-    d2 = fetch_data(args.ticker2, label2, args.start, args.end)
+def run(params: dict):
+    """
+    Fetch, align and backtest one configuration without printing or plotting.
+    `params` uses DEFAULTS keys (missing keys fall back to DEFAULTS), so sweep
+    harnesses can call this directly. Returns (results, stats).
+    """
+    cfg = {**DEFAULTS, **params}
+    label1, label2 = cfg["label1"], cfg["label2"]
+
+    # Load & align data (duplicate-safe); both downloads run concurrently
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f1 = ex.submit(fetch_data, cfg["ticker1"], label1, cfg["start_date"], cfg["end_date"])
+        f2 = ex.submit(fetch_data, cfg["ticker2"], label2, cfg["start_date"], cfg["end_date"])
+        d1, d2 = f1.result(), f2.result()
     data = align_two(d1, d2)
 
     # Prepare execution & risk control parameters
-    params = TradeParams(
-        hysteresis_bps=args.hysteresis_bps,
-        cooldown_days=args.cooldown,
-        fee_bps=args.fee_bps,
-        slippage_bps=args.slippage_bps,
+    trade_params = TradeParams(
+        hysteresis_bps=cfg["hysteresis_bps"],
+        cooldown_days=cfg["cooldown_days"],
+        fee_bps=cfg["fee_bps"],
+        slippage_bps=cfg["slippage_bps"],
     )
 
     # Run backtest
-    results, stats = backtest_switching(
+    return backtest_switching(
         data=data,
-        shares1_init=args.shares1,
-        shares2_init=args.shares2,
-        cash_init=args.cash,
-        params=params,
+        shares1_init=cfg["shares1_init"],
+        shares2_init=cfg["shares2_init"],
+        cash_init=cfg["cash_init"],
+        params=trade_params,
         label1=label1,
         label2=label2,
+        export_dtype=cfg["export_dtype"],
     )
 
+
+def main():
+    parser = argparse.ArgumentParser(description="VFV vs SU Switching Backtest (Robust & Fixed)")
+    parser.add_argument("--start", dest="start_date", default=DEFAULTS["start_date"])
+    parser.add_argument("--end", dest="end_date", default=DEFAULTS["end_date"])
+    parser.add_argument("--ticker1", default=DEFAULTS["ticker1"])
+    parser.add_argument("--ticker2", default=DEFAULTS["ticker2"])
+    parser.add_argument("--shares1", dest="shares1_init", type=int, default=DEFAULTS["shares1_init"])
+    parser.add_argument("--shares2", dest="shares2_init", type=int, default=DEFAULTS["shares2_init"])
+    parser.add_argument("--cash", dest="cash_init", type=float, default=DEFAULTS["cash_init"])
+    parser.add_argument("--hysteresis_bps", type=float, default=DEFAULTS["hysteresis_bps"])
+    parser.add_argument("--cooldown", dest="cooldown_days", type=int, default=DEFAULTS["cooldown_days"])
+    parser.add_argument("--fee_bps", type=float, default=DEFAULTS["fee_bps"])
+    parser.add_argument("--slippage_bps", type=float, default=DEFAULTS["slippage_bps"])
+    parser.add_argument("--export_csv", default=DEFAULTS["export_csv"])
+    parser.add_argument("--export_dtype", choices=["float64", "float32"], default=DEFAULTS["export_dtype"])
+    parser.add_argument("--plot_file", default=DEFAULTS["plot_file"],
+                        help="Write the plot to this file (non-interactive Agg backend)")
+    parser.add_argument("--no-plot", action="store_true")
+    args = parser.parse_args()  # in notebooks, call run({...}) instead
+
+    cfg = {**DEFAULTS, **vars(args)}
+    results, stats = run(cfg)
+
     # Metrics
     m_active = compute_metrics(results["Equity_Active"])
     m_passive = compute_metrics(results["Equity_Passive"])
 
     # Summary
     print("\n=== Parameters ===")
-    print(f"Dates: {args.start} → {args.end}")
+    print(f"Dates: {args.start_date} → {args.end_date}")
     print(f"Tickers: {args.ticker1} vs {args.ticker2}")
-    print(f"Hysteresis: {args.hysteresis_bps} bps | Cooldown: {args.cooldown} days | "
+    print(f"Hysteresis: {args.hysteresis_bps} bps | Cooldown: {args.cooldown_days} days | "
           f"Fees: {args.fee_bps} bps | Slippage: {args.slippage_bps} bps")
 
     print("\n=== Performance (Active) ===")
@@ -393,7 +555,7 @@ def main():
 
     # Plot
     if DEFAULTS["plot"] and not args.no_plot:
-        plot_results(results, label1=label1, label2=label2)
+        plot_results(results, label1=cfg["label1"], label2=cfg["label2"], save_path=args.plot_file)
 
 
 if __name__ == "__main__":
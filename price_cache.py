@@ -0,0 +1,61 @@
+"""
+On-disk Parquet cache for Yahoo price downloads, shared by StockBinaryComparison.py
+and signal2.py. Files live under $BINSIG_CACHE_DIR (default ~/.cache/binsig).
+"""
+import hashlib
+import os
+import tempfile
+import time
+import pandas as pd
+
+
+def cache_dir() -> str:
+    # Read at call time so a .env loaded after import (signal2.py) still applies
+    return os.path.expanduser(os.getenv("BINSIG_CACHE_DIR", "~/.cache/binsig"))
+
+
+def write_parquet_atomic(df: pd.DataFrame, path: str):
+    """
+    Write df to a temp file in the same directory, then os.replace() it into place,
+    so readers (or a concurrent writer) never see a partially written cache file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".parquet.tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp, engine="pyarrow", compression="zstd")
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass  # keep the original error
+        raise
+
+
+def cached_frame(key, ttl: float, fetch, valid=None) -> pd.DataFrame:
+    """
+    Return the cached frame for `key` if its file is younger than `ttl` seconds,
+    otherwise call fetch() and cache the result if it is non-empty (or, when given,
+    if valid(df) is true, so incomplete data is refetched next time).
+
+    The cache is only an optimisation: an unreadable file counts as a miss, and a
+    failed write (unwritable dir, full disk, pyarrow error) is skipped so the
+    freshly fetched frame is still returned.
+    """
+    name = hashlib.sha1(repr(key).encode()).hexdigest()
+    path = os.path.join(cache_dir(), f"{name}.parquet")
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl:
+        try:
+            return pd.read_parquet(path, engine="pyarrow")
+        except (OSError, ValueError):
+            pass  # unreadable cache file: treat as a miss and download again
+
+    df = fetch()
+    cacheable = valid(df) if valid is not None else not df.empty
+    if cacheable:
+        try:
+            write_parquet_atomic(df, path)
+        except (OSError, ValueError):
+            pass  # caching is best-effort
+    return df
@@ -1,12 +1,23 @@
 import os, time, requests, pytz, argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import yfinance as yf
+from functools import lru_cache
+import pandas as pd
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from price_cache import cached_frame
 
 load_dotenv()  # loads .env locally; ignored on Render (set env vars in dashboard)
 
 # ---------------- Config & Defaults ----------------
 TZ = pytz.timezone("America/Toronto")
+CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", "900"))  # seconds
+CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{ticker}"
+
+# One pooled keep-alive session: later Yahoo calls reuse the TCP+TLS connection
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+SESSION.headers["User-Agent"] = "Mozilla/5.0"  # Yahoo rejects the default requests UA
 
 def env_bool(name: str, default=False):
     val = os.getenv(name)
@@ -40,25 +51,66 @@ def get_args():
     return p.parse_args()
 
 # ---------------- Data helpers ----------------
+def yahoo_chart(ticker: str, range_: str, interval: str) -> pd.DataFrame:
+    """
+    Fetch Open/Close bars from Yahoo's chart API over the pooled SESSION.
+    Returns an empty frame when Yahoo has no bars yet.
+    """
+    r = SESSION.get(CHART_URL.format(ticker=ticker),
+                    params={"range": range_, "interval": interval}, timeout=20)
+    if r.status_code >= 300:
+        raise RuntimeError(f"Yahoo chart error {r.status_code} for {ticker}: {r.text[:200]}")
+    result = (r.json().get("chart") or {}).get("result") or []
+    if not result or not result[0].get("timestamp"):
+        return pd.DataFrame(columns=["Open", "Close"])
+    quote = ((result[0].get("indicators") or {}).get("quote") or [{}])[0]
+    if quote.get("open") is None or quote.get("close") is None:
+        return pd.DataFrame(columns=["Open", "Close"])  # malformed payload: treat as no bars
+    # Keep every bar (even null ones) so row 0 is always the session's first bar
+    return pd.DataFrame({"Open": quote["open"], "Close": quote["close"]},
+                        index=pd.to_datetime(result[0]["timestamp"], unit="s", utc=True), dtype="float64")
+
+def cached_chart(ticker: str, range_: str, interval: str, ttl=CACHE_TTL, valid=None) -> pd.DataFrame:
+    """
+    yahoo_chart behind the on-disk Parquet cache (price_cache), keyed by (ticker, range, interval).
+    Re-runs within `ttl` seconds read the cached frame instead of calling Yahoo.
+    Empty frames (or ones failing `valid`) are never cached so retries still hit the network.
+    """
+    return cached_frame((ticker, range_, interval), ttl,
+                        lambda: yahoo_chart(ticker, range_, interval), valid=valid)
+
 def prev_close(ticker: str) -> float:
     """
     Get the most recent daily close (yesterday's close) for the ticker.
+    Memoized per (ticker, Toronto date), so repeat calls in one process are free.
     """
-    df = yf.download(ticker, period="5d", interval="1d", auto_adjust=False, progress=False)
-    if df.empty or "Close" not in df.columns:
+    return _prev_close(ticker, datetime.now(TZ).date())
+
+@lru_cache(maxsize=32)
+def _prev_close(ticker: str, day) -> float:
+    closes = cached_chart(ticker, "5d", "1d")["Close"].dropna()
+    if closes.empty:
         raise RuntimeError(f"No daily close data for {ticker}")
-    return float(df["Close"].iloc[-1])
+    return float(closes.iloc[-1])
 
 def today_open(ticker: str, retries=8, delay=10) -> float:
     """
     Get today's 'open' using the first 1-minute bar's Open after the market opens.
     Retries a few times because the bar may not be available exactly at 09:30.
+    Memoized per (ticker, Toronto date); failures are not cached.
     """
+    return _today_open(ticker, datetime.now(TZ).date(), retries, delay)
+
+def _first_open_ready(df: pd.DataFrame) -> bool:
+    return not df.empty and pd.notna(df["Open"].iloc[0])
+
+@lru_cache(maxsize=32)
+def _today_open(ticker: str, day, retries: int, delay: int) -> float:
     for _ in range(retries):
-        df = yf.download(ticker, period="1d", interval="1m", auto_adjust=False, progress=False)
-        if not df.empty and "Open" in df.columns:
+        df = cached_chart(ticker, "1d", "1m", valid=_first_open_ready)
+        if _first_open_ready(df):
             return float(df["Open"].iloc[0])   # first minute bar ~ session open
-        time.sleep(delay)
+        time.sleep(delay)   # no bars yet, or the first bar's open is still null
     raise RuntimeError(f"Open not available yet for {ticker}")
 
 # ---------------- Discord ----------------
@@ -79,10 +131,13 @@ def main():
         if not (now.hour == 9 and 40 <= now.minute <= 50):
             return
 
-    # Fetch yesterday's closes & today's opens
-    cA, cB = prev_close(args.ticker_a), prev_close(args.ticker_b)
-    oA = today_open(args.ticker_a, retries=args.retries, delay=args.delay)
-    oB = today_open(args.ticker_b, retries=args.retries, delay=args.delay)
+    # Fetch yesterday's closes & today's opens (all four requests in flight at once)
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        fcA = ex.submit(prev_close, args.ticker_a)
+        fcB = ex.submit(prev_close, args.ticker_b)
+        foA = ex.submit(today_open, args.ticker_a, retries=args.retries, delay=args.delay)
+        foB = ex.submit(today_open, args.ticker_b, retries=args.retries, delay=args.delay)
+        cA, cB, oA, oB = fcA.result(), fcB.result(), foA.result(), foB.result()
 
     # Overnight returns (prev close -> today's open)
     rA = (oA - cA) / cA